@@ -1,120 +1,183 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-from datetime import datetime
+import functools
+from collections import namedtuple
+from datetime import date, datetime
 
 # --- Page Configuration ---
 st.set_page_config(page_title="EVM Calculator", layout="wide", page_icon="📊")
 
 # --- Helper Functions ---
 
-def calculate_evm_metrics(bac, pv, ev, ac):
-    """Calculate all EVM metrics."""
-    metrics = {}
-    
+# Formatters for metric cards
+def _fmt_dollar(value):
+    return f"${value:,.0f}"
+
+def _fmt_ratio(value):
+    return f"{value:.2f}"
+
+@functools.cache
+def _go():
+    """Imports plotly.graph_objects on first use; only the S-Curve needs it."""
+    import plotly.graph_objects as go
+    return go
+
+EVM = namedtuple('EVM', ['SV', 'CV', 'SPI', 'CPI', 'EAC_Typical', 'EAC_Atypical',
+                         'ETC_Typical', 'ETC_Atypical', 'VAC', 'TCPI_BAC', 'TCPI_EAC'])
+
+def _safe_divide(num, den):
+    """Element-wise num / den, with 0 wherever den is 0."""
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+def calculate_evm_batch(bac, pv, ev, ac):
+    """Calculate EVM metrics for N scenarios at once.
+
+    Accepts scalars or 1-D arrays (broadcast together) and returns an (N, 11) array
+    whose columns follow EVM._fields.
+    """
+    bac, pv, ev, ac = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64))
+                                            for x in (bac, pv, ev, ac)))
+
     # 1. Variances
-    metrics['SV'] = ev - pv
-    metrics['CV'] = ev - ac
-    
+    sv = ev - pv
+    cv = ev - ac
+
     # 2. Performance Indices
-    metrics['SPI'] = ev / pv if pv != 0 else 0
-    metrics['CPI'] = ev / ac if ac != 0 else 0
-    
+    spi = _safe_divide(ev, pv)
+    cpi = _safe_divide(ev, ac)
+
     # 3. Forecasts
     # EAC (Typical) - Assumes future performance is typical of past
-    metrics['EAC_Typical'] = bac / metrics['CPI'] if metrics['CPI'] != 0 else 0
+    eac_t = _safe_divide(bac, cpi)
     # EAC (Atypical) - Assumes future performance returns to baseline
-    metrics['EAC_Atypical'] = ac + (bac - ev)
-    
-    metrics['ETC_Typical'] = metrics['EAC_Typical'] - ac
-    metrics['ETC_Atypical'] = metrics['EAC_Atypical'] - ac
-    
+    eac_a = ac + (bac - ev)
+
+    etc_t = eac_t - ac
+    etc_a = eac_a - ac
+
     # 4. Variance at Completion
-    metrics['VAC'] = bac - metrics['EAC_Typical']
-    
+    vac = bac - eac_t
+
     # 5. To-Complete Performance Index
-    metrics['TCPI_BAC'] = (bac - ev) / (bac - ac) if (bac - ac) != 0 else 0
-    metrics['TCPI_EAC'] = (bac - ev) / (metrics['EAC_Typical'] - ac) if (metrics['EAC_Typical'] - ac) != 0 else 0
+    tcpi_bac = _safe_divide(bac - ev, bac - ac)
+    tcpi_eac = _safe_divide(bac - ev, etc_t)
 
-    return metrics
+    return np.column_stack((sv, cv, spi, cpi, eac_t, eac_a, etc_t, etc_a, vac, tcpi_bac, tcpi_eac))
 
-def generate_s_curve_plot(bac, start_date, finish_date, data_date, ev, ac):
-    """Generates an interactive S-Curve using Plotly with Beta Dist (alpha=2, beta=2)."""
-    
-    total_duration = (finish_date - start_date).days
-    if total_duration <= 0:
-        return go.Figure()
+@st.cache_data(max_entries=128)
+def calculate_evm_metrics(bac, pv, ev, ac):
+    """Calculate all EVM metrics as a plain tuple in the field order of EVM.
 
-    # Generate Time Axis (Days)
-    x_days = np.linspace(0, total_duration, 100)
-    
-    # Beta Distribution Calculation (alpha=2, beta=2)
-    # Formula: Cumulative % = 3t^2 - 2t^3
-    t = x_days / total_duration
-    y_percent = 3 * np.power(t, 2) - 2 * np.power(t, 3)
-    pv_curve = bac * y_percent
-    
-    # Calculate Elapsed Days for Vertical Line
-    elapsed_days = (data_date - start_date).days
-    
-    # Create Plotly Figure
+    EVM is redefined on every script run, so the cached value must not reference it;
+    wrap the result with EVM(*...) at the call site.
+    """
+    return tuple(calculate_evm_batch(bac, pv, ev, ac)[0].tolist())
+
+@st.cache_resource
+def unit_s_curve():
+    """Beta Dist (alpha=2, beta=2) S-Curve on 100 points of [0, 1]: 3t^2 - 2t^3."""
+    # Cached rather than module-level: Streamlit re-executes this script on every rerun.
+    # float32 is plenty for the day grid and halves its payload to the browser; the
+    # curve stays float64 since float32 loses whole dollars once BAC exceeds ~$16.7M.
+    t = np.linspace(0.0, 1.0, 100)
+    return t.astype(np.float32), t * t * (3.0 - 2.0 * t)
+
+def _build_skeleton():
+    """Builds the static parts of the S-Curve figure; update_s_curve fills in the data."""
+    go = _go()
     fig = go.Figure()
 
-    # 1. Add PV S-Curve (Baseline)
-    fig.add_trace(go.Scatter(
-        x=x_days, 
-        y=pv_curve, 
+    # 1. PV S-Curve (Baseline)
+    fig.add_trace(go.Scattergl(
         mode='lines', 
         name='Planned Value (PV)', 
         line=dict(color='royalblue', width=3),
         hovertemplate='Day: %{x:.0f}<br>PV: $%{y:,.0f}<extra></extra>'
     ))
 
-    # 2. Add Data Date Line
-    fig.add_vline(x=elapsed_days, line_width=2, line_dash="dash", line_color="gray",
-                  annotation_text=f"Data Date (Day {elapsed_days})", annotation_position="top left")
-
-    # 3. Add EV Point
-    fig.add_trace(go.Scatter(
-        x=[elapsed_days], 
-        y=[ev], 
+    # 2. EV / AC Points (one trace, per-point marker styling)
+    fig.add_trace(go.Scattergl(
         mode='markers+text', 
-        name='Earned Value (EV)', 
-        marker=dict(size=12, color='green', symbol='triangle-up'),
-        text=["EV"], 
-        textposition="top center",
-        hovertemplate=f'EV: ${ev:,.0f}<extra></extra>'
+        name='EV / AC', 
+        marker=dict(size=12, color=['green', 'red'], symbol=['triangle-up', 'triangle-down']),
+        text=["EV", "AC"], 
+        textposition=["top center", "bottom center"],
+        hovertemplate='%{text}: $%{y:,.0f}<extra></extra>'
     ))
 
-    # 4. Add AC Point
-    fig.add_trace(go.Scatter(
-        x=[elapsed_days], 
-        y=[ac], 
-        mode='markers+text', 
-        name='Actual Cost (AC)', 
-        marker=dict(size=12, color='red', symbol='triangle-down'),
-        text=["AC"], 
-        textposition="bottom center",
-        hovertemplate=f'AC: ${ac:,.0f}<extra></extra>'
-    ))
-
-    # 5. Add BAC Line
-    fig.add_hline(y=bac, line_width=1, line_dash="dot", line_color="purple",
-                  annotation_text=f"BAC: ${bac:,.0f}")
+    # 3. Data Date Line and 4. BAC Line, as raw shapes/annotations (index 0 / index 1)
+    shapes = [
+        dict(type='line', x0=0, x1=0, y0=0, y1=1, yref='paper',
+             line=dict(width=2, dash='dash', color='gray')),
+        dict(type='line', xref='paper', x0=0, x1=1, y0=0, y1=0,
+             line=dict(width=1, dash='dot', color='purple')),
+    ]
+    annotations = [
+        dict(text="Data Date", x=0, y=1, yref='paper', xanchor='right', yanchor='top', showarrow=False),
+        dict(text="BAC", x=1, xref='paper', y=0, xanchor='right', yanchor='bottom', showarrow=False),
+    ]
 
-    # Update Layout
     fig.update_layout(
         title="Project S-Curve (Beta Distribution α=2, β=2)",
         xaxis_title="Days from Start",
         yaxis_title="Value ($)",
         hovermode="x unified",
         template="plotly_white",
+        shapes=shapes,
+        annotations=annotations,
         height=500
     )
+
+    return fig
+
+def update_s_curve(fig, bac, total_duration, elapsed_days, ev, ac):
+    """Writes the project's values into the S-Curve skeleton in place."""
+    # Scale the precomputed unit curve to this project's duration and budget
+    t_unit, y_unit = unit_s_curve()
+    fig.data[0].x = t_unit * np.float32(total_duration)
+    fig.data[0].y = y_unit * bac
+
+    fig.data[1].x = [elapsed_days, elapsed_days]
+    fig.data[1].y = [ev, ac]
+
+    data_date_line, bac_line = fig.layout.shapes
+    data_date_line.x0 = data_date_line.x1 = elapsed_days
+    bac_line.y0 = bac_line.y1 = bac
+
+    data_date_label, bac_label = fig.layout.annotations
+    data_date_label.x = elapsed_days
+    data_date_label.text = f"Data Date (Day {elapsed_days})"
+    bac_label.y = bac
+    bac_label.text = f"BAC: ${bac:,.0f}"
+
+@st.cache_resource(max_entries=32, hash_funcs={date: lambda d: d.toordinal()})
+def generate_s_curve_plot(bac, start_date, finish_date, data_date, ev, ac):
+    """Generates an interactive S-Curve using Plotly with Beta Dist (alpha=2, beta=2).
+
+    The returned figure is cached by identity and must not be mutated.
+    """
     
+    # Day counts via ordinals (plain int subtraction, no timedelta objects)
+    start_ordinal = start_date.toordinal()
+    total_duration = finish_date.toordinal() - start_ordinal
+    if total_duration <= 0:
+        return _go().Figure()
+
+    # Calculate Elapsed Days for Vertical Line
+    elapsed_days = data_date.toordinal() - start_ordinal
+
+    fig = _build_skeleton()
+    update_s_curve(fig, bac, total_duration, elapsed_days, ev, ac)
     return fig
 
+# Status summary indexed by (SPI >= 1) << 1 | (CPI >= 1)
+STATUS_MESSAGES = (
+    (st.error, "❌ Project is Behind Schedule and Over Budget."),
+    (st.warning, "⚠️ Project is Behind Schedule but Under Budget."),
+    (st.warning, "⚠️ Project is Ahead of Schedule but Over Budget."),
+    (st.success, "✅ Project is Ahead of Schedule and Under Budget."),
+)
+
 # --- Main Application ---
 
 st.title("📊 Earned Value Management (EVM) Calculator")
@@ -144,45 +207,40 @@ elif data_date < start_date or data_date > finish_date:
 
 else:
     # --- Calculate Metrics ---
-    metrics = calculate_evm_metrics(bac, pv, ev, ac)
+    metrics = EVM(*calculate_evm_metrics(bac, pv, ev, ac))
 
     # --- Layout: Top Row Metrics ---
     st.subheader("Performance Overview")
     
     col1, col2, col3, col4 = st.columns(4)
     
-    # Helper for metric cards
-    def format_metric(label, value, prefix="$", delta=None, is_ratio=False):
-        if is_ratio:
-            val_str = f"{value:.2f}"
-        else:
-            val_str = f"{prefix}{value:,.0f}"
-        
-        st.metric(label=label, value=val_str, delta=delta)
-
     with col1:
-        format_metric("Schedule Variance (SV)", metrics['SV'], delta="Target: > $0")
-        st.metric("SPI (Schedule Perf.)", f"{metrics['SPI']:.2f}", delta="Target: > 1.0")
+        st.metric("Schedule Variance (SV)", _fmt_dollar(metrics.SV), delta="Target: > $0")
+        st.metric("SPI (Schedule Perf.)", _fmt_ratio(metrics.SPI), delta="Target: > 1.0")
     
     with col2:
-        format_metric("Cost Variance (CV)", metrics['CV'], delta="Target: > $0")
-        st.metric("CPI (Cost Perf.)", f"{metrics['CPI']:.2f}", delta="Target: > 1.0")
+        st.metric("Cost Variance (CV)", _fmt_dollar(metrics.CV), delta="Target: > $0")
+        st.metric("CPI (Cost Perf.)", _fmt_ratio(metrics.CPI), delta="Target: > 1.0")
         
     with col3:
-        format_metric("EAC (Typical)", metrics['EAC_Typical'])
-        format_metric("ETC (Typical)", metrics['ETC_Typical'])
+        st.metric("EAC (Typical)", _fmt_dollar(metrics.EAC_Typical))
+        st.metric("ETC (Typical)", _fmt_dollar(metrics.ETC_Typical))
         
     with col4:
-        format_metric("VAC (at EAC)", metrics['VAC'])
-        st.metric("TCPI (for BAC)", f"{metrics['TCPI_BAC']:.2f}")
+        st.metric("VAC (at EAC)", _fmt_dollar(metrics.VAC))
+        st.metric("TCPI (for BAC)", _fmt_ratio(metrics.TCPI_BAC))
 
     # --- Layout: Charts and Tables ---
     col_chart, col_table = st.columns([2, 1])
     
     with col_chart:
         st.subheader("S-Curve Visualization")
-        fig = generate_s_curve_plot(bac, start_date, finish_date, data_date, ev, ac)
-        st.plotly_chart(fig, use_container_width=True)
+        # Reuse this session's last figure when the plot inputs haven't changed
+        s_curve_key = (bac, start_date, finish_date, data_date, ev, ac)
+        if st.session_state.get('_scurve_key') != s_curve_key:
+            st.session_state['_scurve_fig'] = generate_s_curve_plot(*s_curve_key)
+            st.session_state['_scurve_key'] = s_curve_key
+        st.plotly_chart(st.session_state['_scurve_fig'], use_container_width=True)
         
         st.info(f"""
         **Chart Interpretation**: 
@@ -196,35 +254,21 @@ else:
     with col_table:
         st.subheader("Detailed Forecast")
         
-        # Create a clean dataframe for the forecast details
-        forecast_data = {
-            "Scenario": ["Typical (Trends Continue)", "Atypical (Return to Plan)"],
-            "EAC": [metrics['EAC_Typical'], metrics['EAC_Atypical']],
-            "ETC": [metrics['ETC_Typical'], metrics['ETC_Atypical']],
-            "TCPI": [metrics['TCPI_EAC'], metrics['TCPI_BAC']] # Note: TCPI for EAC is usually used with typical EAC
-        }
-        
-        df_forecast = pd.DataFrame(forecast_data)
-        
-        # Format currency columns
-        def format_currency(x):
-            return f"${x:,.0f}"
-        
-        st.dataframe(
-            df_forecast.style.format({'EAC': format_currency, 'ETC': format_currency}),
-            hide_index=True,
-            use_container_width=True
+        # Forecast details as a pre-formatted markdown table (note: TCPI for EAC is usually used with typical EAC)
+        forecast_rows = (
+            ("Typical (Trends Continue)", metrics.EAC_Typical, metrics.ETC_Typical, metrics.TCPI_EAC),
+            ("Atypical (Return to Plan)", metrics.EAC_Atypical, metrics.ETC_Atypical, metrics.TCPI_BAC),
+        )
+        # Dollar signs are escaped so Streamlit does not render them as LaTeX
+        st.markdown(
+            "| Scenario | EAC | ETC | TCPI |\n|---|--:|--:|--:|\n"
+            + "".join(f"| {scenario} | \\${eac:,.0f} | \\${etc:,.0f} | {tcpi:.2f} |\n"
+                      for scenario, eac, etc, tcpi in forecast_rows)
         )
         
         st.markdown("### Status Summary")
-        if metrics['SPI'] >= 1 and metrics['CPI'] >= 1:
-            st.success("✅ Project is Ahead of Schedule and Under Budget.")
-        elif metrics['SPI'] < 1 and metrics['CPI'] >= 1:
-            st.warning("⚠️ Project is Behind Schedule but Under Budget.")
-        elif metrics['SPI'] >= 1 and metrics['CPI'] < 1:
-            st.warning("⚠️ Project is Ahead of Schedule but Over Budget.")
-        else:
-            st.error("❌ Project is Behind Schedule and Over Budget.")
+        status_fn, status_msg = STATUS_MESSAGES[(int(metrics.SPI >= 1) << 1) | int(metrics.CPI >= 1)]
+        status_fn(status_msg)
 
 # --- Footer ---
 st.markdown("---")
@@ -1,14 +1,93 @@
 import streamlit as st
 import duckdb
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 DB_FILE = "hospital_data.duckdb"
 
+# Departments drawn individually in the comparison bar chart; the rest are averaged into one bar
+MAX_CHART_DEPARTMENTS = 40
+
+# CSV headers -> case_data columns
+CSV_COLUMNS = {
+    'Department': 'department',
+    'Fully Met': 'fully_met',
+    'Fully Met %': 'fully_met_pct',
+    'Partially Met': 'partially_met',
+    'Partially Met %': 'partially_met_pct',
+    'Not Met': 'not_met',
+    'Not Met %': 'not_met_pct',
+    'Not Applicable': 'not_applicable',
+}
+# Value used when an uploaded file lacks a column
+CASE_DATA_DEFAULTS = {
+    'department': '',
+    'fully_met': 0,
+    'fully_met_pct': 0.0,
+    'partially_met': 0,
+    'partially_met_pct': 0.0,
+    'not_met': 0,
+    'not_met_pct': 0.0,
+    'not_applicable': 0,
+}
+# Columns kept from uploaded CSVs (either header style, plus the optional year column) and their types
+UPLOAD_COLUMNS = {*CSV_COLUMNS, *CSV_COLUMNS.values(), 'Year', 'year'}
+UPLOAD_DTYPES = {
+    'Department': 'str',
+    'Fully Met': 'Int32',
+    'Fully Met %': 'float64',
+    'Partially Met': 'Int32',
+    'Partially Met %': 'float64',
+    'Not Met': 'Int32',
+    'Not Met %': 'float64',
+    'Not Applicable': 'Int32',
+}
+CASE_DATA_DTYPES = {
+    'fully_met': 'int32',
+    'fully_met_pct': 'float64',
+    'partially_met': 'int32',
+    'partially_met_pct': 'float64',
+    'not_met': 'int32',
+    'not_met_pct': 'float64',
+    'not_applicable': 'int32',
+}
+
+# Keyed with year before department so (case_id, year) lookups and deletes hit contiguous rows
+CASE_DATA_KEY = ['case_id', 'year', 'department']
+CASE_DATA_DDL = """
+    CREATE TABLE {table} (
+        case_id VARCHAR,
+        department VARCHAR,
+        fully_met INTEGER,
+        fully_met_pct DOUBLE,
+        partially_met INTEGER,
+        partially_met_pct DOUBLE,
+        not_met INTEGER,
+        not_met_pct DOUBLE,
+        not_applicable INTEGER,
+        year INTEGER,
+        PRIMARY KEY (case_id, year, department)
+    )
+"""
+
+@st.cache_resource
+def get_conn():
+    # One process-wide DuckDB connection; helpers each work on their own cursor of it
+    return duckdb.connect(DB_FILE)
+
+def fetch_arrow(result):
+    # .arrow() is a pyarrow Table on older DuckDB releases and a RecordBatchReader on newer ones
+    table = result.arrow()
+    return table.read_all() if hasattr(table, 'read_all') else table
+
+@st.cache_resource
 def init_db():
-    conn = duckdb.connect(DB_FILE)
+    # Schema setup and migration run once per process, not on every rerun
+    conn = get_conn().cursor()
     conn.execute("""
         CREATE TABLE IF NOT EXISTS cases (
             case_id VARCHAR PRIMARY KEY,
@@ -19,114 +98,145 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS case_data (
-            case_id VARCHAR,
-            department VARCHAR,
-            fully_met INTEGER,
-            fully_met_pct DOUBLE,
-            partially_met INTEGER,
-            partially_met_pct DOUBLE,
-            not_met INTEGER,
-            not_met_pct DOUBLE,
-            not_applicable INTEGER,
-            year INTEGER,
-            PRIMARY KEY (case_id, department, year)
-        )
-    """)
+    conn.execute(CASE_DATA_DDL.format(table="IF NOT EXISTS case_data"))
+
+    # Databases created with the old (case_id, department, year) key are rebuilt once
+    pk = conn.execute("""
+        SELECT constraint_column_names FROM duckdb_constraints()
+        WHERE table_name = 'case_data' AND constraint_type = 'PRIMARY KEY'
+    """).fetchone()
+    if pk and list(pk[0]) != CASE_DATA_KEY:
+        conn.begin()
+        try:
+            conn.execute("CREATE TEMP TABLE case_data_old AS SELECT * FROM case_data")
+            conn.execute("DROP TABLE case_data")
+            conn.execute(CASE_DATA_DDL.format(table="case_data"))
+            conn.execute("INSERT INTO case_data SELECT * FROM case_data_old")
+            conn.execute("DROP TABLE case_data_old")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
     conn.close()
 
+@st.cache_data(ttl=300, max_entries=128)
 def get_cases():
-    conn = duckdb.connect(DB_FILE)
+    conn = get_conn().cursor()
     df = conn.execute("SELECT case_id, description, case_date, manager FROM cases ORDER BY case_date DESC").df()
     conn.close()
     return df
 
 def add_case(case_id, description, case_date, manager, notes):
-    conn = duckdb.connect(DB_FILE)
+    conn = get_conn().cursor()
     conn.execute("""
         INSERT INTO cases (case_id, description, case_date, manager, notes)
         VALUES (?, ?, ?, ?, ?)
     """, [case_id, description, case_date, manager, notes])
     conn.close()
+    get_cases.clear()
 
 def save_case_data(case_id, df, year):
-    conn = duckdb.connect(DB_FILE)
-    conn.execute("DELETE FROM case_data WHERE case_id = ? AND year = ?", [case_id, year])
-    
-    for _, row in df.iterrows():
+    # Normalize CSV headers to case_data columns, filling any missing column with its default
+    staging = df.rename(columns=CSV_COLUMNS)
+    staging = staging.assign(**{col: default for col, default in CASE_DATA_DEFAULTS.items()
+                                if col not in staging.columns})
+    staging = staging.fillna({'department': CASE_DATA_DEFAULTS['department']})
+    staging = staging[list(CASE_DATA_DEFAULTS)].astype(CASE_DATA_DTYPES).assign(case_id=case_id, year=year)
+
+    # Replace the year atomically: a failed insert must not leave the old rows deleted
+    conn = get_conn().cursor()
+    conn.register('staging', staging)
+    conn.begin()
+    try:
+        conn.execute("DELETE FROM case_data WHERE case_id = ? AND year = ?", [case_id, year])
         conn.execute("""
             INSERT INTO case_data (case_id, department, fully_met, fully_met_pct, partially_met, partially_met_pct, not_met, not_met_pct, not_applicable, year)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, [
-            case_id,
-            row.get('Department', row.get('department', '')),
-            int(row.get('Fully Met', row.get('fully_met', 0))),
-            float(row.get('Fully Met %', row.get('fully_met_pct', 0))),
-            int(row.get('Partially Met', row.get('partially_met', 0))),
-            float(row.get('Partially Met %', row.get('partially_met_pct', 0))),
-            int(row.get('Not Met', row.get('not_met', 0))),
-            float(row.get('Not Met %', row.get('not_met_pct', 0))),
-            int(row.get('Not Applicable', row.get('not_applicable', 0))),
-            year
-        ])
-    conn.close()
-
+            SELECT case_id, department, fully_met, fully_met_pct, partially_met, partially_met_pct, not_met, not_met_pct, not_applicable, year
+            FROM staging
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.unregister('staging')
+        conn.close()
+    get_case_data.clear()
+    get_case_years.clear()
+    get_analysis.clear()
+
+@st.cache_data(ttl=300, max_entries=128)
 def get_case_data(case_id, year):
-    conn = duckdb.connect(DB_FILE)
-    df = conn.execute("""
+    # Arrow-backed columns: only displayed, and st.dataframe serializes to Arrow anyway
+    conn = get_conn().cursor()
+    result = conn.execute("""
         SELECT department, fully_met, fully_met_pct, partially_met, partially_met_pct, 
                not_met, not_met_pct, not_applicable
         FROM case_data 
         WHERE case_id = ? AND year = ?
-    """, [case_id, year]).df()
+    """, [case_id, year])
+    df = fetch_arrow(result).to_pandas(types_mapper=pd.ArrowDtype)
     conn.close()
     return df
 
+@st.cache_data(ttl=300, max_entries=128)
 def get_case_years(case_id):
-    conn = duckdb.connect(DB_FILE)
+    conn = get_conn().cursor()
     years = conn.execute("SELECT DISTINCT year FROM case_data WHERE case_id = ?", [case_id]).fetchall()
     conn.close()
     return [y[0] for y in years]
 
-def analyze_data(before_df, after_df):
-    if before_df.empty or after_df.empty:
-        return pd.DataFrame(columns=['Department', 'Before', 'After', 'Variance'])
-
-    # Handle both lowercase (from DB) and capitalized (from CSV) column names
-    dept_col = 'department' if 'department' in before_df.columns else 'Department'
-    pct_col = 'fully_met_pct' if 'fully_met_pct' in before_df.columns else 'Fully Met %'
-
-    after_dept_col = 'department' if 'department' in after_df.columns else 'Department'
-    after_pct_col = 'fully_met_pct' if 'fully_met_pct' in after_df.columns else 'Fully Met %'
-
-    dept_data = []
-    for _, before_row in before_df.iterrows():
-        dept_name = str(before_row.get(dept_col, '')).strip()
-        if not dept_name or dept_name == '-' or 'Sum' in dept_name:
-            continue
-
-        after_row = after_df[after_df[after_dept_col].astype(str).str.strip() == dept_name]
-        if after_row.empty:
-            continue
-
-        before_pct = float(before_row.get(pct_col, 0) or 0)
-        after_pct = float(after_row.iloc[0].get(after_pct_col, 0) or 0)
-        variance = after_pct - before_pct
-
-        dept_data.append({
-            'Department': dept_name,
-            'Before': before_pct,
-            'After': after_pct,
-            'Variance': variance
-        })
-
-    if not dept_data:
-        return pd.DataFrame(columns=['Department', 'Before', 'After', 'Variance'])
-
-    return pd.DataFrame(dept_data)
+@st.cache_data(max_entries=16, hash_funcs={UploadedFile: lambda f: f.file_id})
+def read_upload(uploaded_file):
+    # Parsed once per uploaded file; reruns with the same upload reuse the frame
+    uploaded_file.seek(0)
+    return pd.read_csv(uploaded_file, usecols=lambda c: c in UPLOAD_COLUMNS, dtype=UPLOAD_DTYPES)
+
+@st.cache_data(ttl=300, max_entries=128)
+def get_analysis(case_id, before_year, after_year):
+    # Join the two periods inside DuckDB; only the per-department comparison comes back.
+    # Fetched via Arrow but kept on NumPy dtypes, which the masks, Styler and charts below expect.
+    conn = get_conn().cursor()
+    result = conn.execute("""
+        SELECT trim(b.department) AS Department,
+               b.fully_met_pct AS "Before",
+               a.fully_met_pct AS "After",
+               a.fully_met_pct - b.fully_met_pct AS Variance
+        FROM case_data b
+        JOIN (
+            -- One after-row per trimmed name (first stored wins), so 'Admin' and 'Admin ' don't double up
+            SELECT * FROM case_data
+            WHERE case_id = ? AND year = ?
+            QUALIFY row_number() OVER (PARTITION BY trim(department) ORDER BY rowid) = 1
+        ) a
+          ON trim(a.department) = trim(b.department)
+        WHERE b.case_id = ? AND b.year = ?
+          AND trim(b.department) NOT IN ('', '-')
+          AND b.department NOT LIKE '%Sum%'
+        ORDER BY b.rowid
+    """, [case_id, after_year, case_id, before_year])
+    df = fetch_arrow(result).to_pandas()
+    conn.close()
+    return df
 
-def generate_summary(analysis_df):
+def chart_departments(analysis_df, limit=MAX_CHART_DEPARTMENTS):
+    # Keep the bar chart readable and cheap to render: the largest movers plus one "Others" bar
+    if len(analysis_df) <= limit:
+        return analysis_df
+
+    by_magnitude = analysis_df.reindex(analysis_df['Variance'].abs().sort_values(ascending=False).index)
+    head = by_magnitude.head(limit)
+    rest = by_magnitude.iloc[limit:]
+    others = pd.DataFrame([{
+        'Department': f"Others (N={len(rest)})",
+        'Before': rest['Before'].mean(),
+        'After': rest['After'].mean(),
+        'Variance': rest['Variance'].mean(),
+    }])
+    return pd.concat([head, others], ignore_index=True)
+
+def generate_summary(analysis_df, improved_mask=None, declined_mask=None):
     if analysis_df is None or analysis_df.empty or len(analysis_df) == 0:
         return "No data available for analysis."
     
@@ -134,22 +244,35 @@ def generate_summary(analysis_df):
     total_after = analysis_df['After'].mean()
     total_change = total_after - total_before
     
-    improved = analysis_df[analysis_df['Variance'] > 0]
-    declined = analysis_df[analysis_df['Variance'] < 0]
+    # Callers that already split the variances pass their masks in
+    if improved_mask is None:
+        improved_mask = analysis_df['Variance'].to_numpy() > 0
+    if declined_mask is None:
+        declined_mask = analysis_df['Variance'].to_numpy() < 0
+    improved = analysis_df[improved_mask]
+    declined = analysis_df[declined_mask]
     
     top_improved = improved.nlargest(3, 'Variance')
     top_declined = declined.nsmallest(3, 'Variance')
     best_depts = analysis_df[analysis_df['After'] >= 90]['Department'].tolist()
+
+    improved_str = (top_improved['Department'] + ' (+' + top_improved['Variance'].map('{:.1f}'.format) + '%)').str.cat(sep=', ')
+    declined_str = (top_declined['Department'] + ' (' + top_declined['Variance'].map('{:.1f}'.format) + '%)').str.cat(sep=', ')
     
     summary = f"""
 **Overall Performance:** The hospital's overall compliance rate has {'improved' if total_change >= 0 else 'declined'} from **{total_before:.1f}%** to **{total_after:.1f}%**, representing a **{total_change:+.1f} percentage point** change. {len(improved)} out of {len(analysis_df)} departments showed improvement, while {len(declined)} departments experienced decline.
 
-**Key Improvements:** {', '.join([f"{row['Department']} (+{row['Variance']:.1f}%)" for _, row in top_improved.iterrows()]) if len(top_improved) > 0 else 'None'} demonstrated the most significant improvements. Departments achieving 90%+ compliance include: {', '.join(best_depts) if best_depts else 'None'}.
+**Key Improvements:** {improved_str or 'None'} demonstrated the most significant improvements. Departments achieving 90%+ compliance include: {', '.join(best_depts) if best_depts else 'None'}.
 
-**Areas of Concern:** {', '.join([f"{row['Department']} ({row['Variance']:.1f}%)" for _, row in top_declined.iterrows()]) if len(top_declined) > 0 else 'No departments declined'} require attention. Recommendations: Focus resources on underperforming departments, maintain momentum in high-performing areas, and implement best practices from top-improving departments across the organization.
+**Areas of Concern:** {declined_str or 'No departments declined'} require attention. Recommendations: Focus resources on underperforming departments, maintain momentum in high-performing areas, and implement best practices from top-improving departments across the organization.
 """
     return summary
 
+@st.cache_data(max_entries=32)
+def generate_summary_cached(analysis_key, _analysis_df, _improved_mask=None, _declined_mask=None):
+    # Underscored arguments are not hashed by Streamlit; analysis_key identifies the frame's contents
+    return generate_summary(_analysis_df, _improved_mask, _declined_mask)
+
 st.set_page_config(page_title="Hospital Performance Dashboard", layout="wide")
 init_db()
 
@@ -214,7 +337,9 @@ st.markdown("<p style='color: white; text-align: center; margin-bottom: 20px;'>C
 
 tab1, tab2 = st.tabs(["📊 Analysis", "➕ Add New Case"])
 
-with tab1:
+# Each tab's interactive section is a fragment: its own widgets rerun only that section
+@st.fragment
+def render_analysis():
     cases = get_cases()
 
     if cases.empty:
@@ -257,7 +382,7 @@ with tab1:
                     if st.session_state.get('run_analysis', False):
                         before_df = get_case_data(selected_case, before_year)
                         after_df = get_case_data(selected_case, after_year)
-                        analysis = analyze_data(before_df, after_df)
+                        analysis = get_analysis(selected_case, before_year, after_year)
 
                         if analysis.empty:
                             st.warning("No matching departments found between the two periods.")
@@ -265,9 +390,12 @@ with tab1:
                             total_before = analysis['Before'].mean()
                             total_after = analysis['After'].mean()
                             total_change = total_after - total_before
-                            improved_count = len(analysis[analysis['Variance'] > 0])
-                            declined_count = len(analysis[analysis['Variance'] < 0])
-                            unchanged_count = len(analysis[analysis['Variance'] == 0])
+                            variances = analysis['Variance'].to_numpy()
+                            improved_mask = variances > 0
+                            declined_mask = variances < 0
+                            improved_count = int(improved_mask.sum())
+                            declined_count = int(declined_mask.sum())
+                            unchanged_count = int((variances == 0).sum())
 
                             st.divider()
 
@@ -312,27 +440,24 @@ with tab1:
 
                             with chart_col1:
                                 st.markdown("### Compliance Comparison by Department")
-                                fig_bar = go.Figure()
-                                fig_bar.add_trace(go.Bar(
-                                    name=f'Before ({before_year})',
-                                    x=analysis['Department'],
-                                    y=analysis['Before'],
-                                    marker_color='rgba(102, 126, 234, 0.7)'
-                                ))
-                                fig_bar.add_trace(go.Bar(
-                                    name=f'After ({after_year})',
-                                    x=analysis['Department'],
-                                    y=analysis['After'],
-                                    marker_color='rgba(16, 185, 129, 0.7)'
-                                ))
-                                fig_bar.update_layout(
-                                    barmode='group',
-                                    yaxis_title='Fully Met %',
-                                    yaxis=dict(range=[0, 100]),
-                                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                                    margin=dict(l=20, r=20, t=40, b=20),
-                                    height=350
-                                )
+                                chart_df = chart_departments(analysis)
+                                # Whole figure as one spec, validated once instead of per add_trace/update_layout
+                                departments = chart_df['Department'].tolist()
+                                fig_bar = go.Figure({
+                                    'data': [
+                                        {'type': 'bar', 'name': f'Before ({before_year})', 'x': departments,
+                                         'y': chart_df['Before'].tolist(), 'marker': {'color': 'rgba(102, 126, 234, 0.7)'}},
+                                        {'type': 'bar', 'name': f'After ({after_year})', 'x': departments,
+                                         'y': chart_df['After'].tolist(), 'marker': {'color': 'rgba(16, 185, 129, 0.7)'}},
+                                    ],
+                                    'layout': {
+                                        'barmode': 'group',
+                                        'yaxis': {'title': {'text': 'Fully Met %'}, 'range': [0, 100]},
+                                        'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
+                                        'margin': {'l': 20, 'r': 20, 't': 40, 'b': 20},
+                                        'height': 350,
+                                    },
+                                })
                                 st.plotly_chart(fig_bar, use_container_width=True)
 
                             with chart_col2:
@@ -355,27 +480,23 @@ with tab1:
                             st.markdown("### Key Variances by Department")
                             analysis_sorted = analysis.sort_values('Variance', ascending=False)
 
-                            def get_status(variance):
-                                if variance > 0:
-                                    return "📈 Improved"
-                                elif variance < 0:
-                                    return "📉 Declined"
-                                return "➖ No Change"
-
                             display_df = analysis_sorted.copy()
-                            display_df['Status'] = display_df['Variance'].apply(get_status)
+                            variance_values = display_df['Variance'].to_numpy()
+                            display_df['Status'] = np.select(
+                                [variance_values > 0, variance_values < 0],
+                                ["📈 Improved", "📉 Declined"],
+                                default="➖ No Change"
+                            )
                             display_df.columns = ['Department', f'Before ({before_year}) %', f'After ({after_year}) %', 'Change %', 'Status']
 
-                            def highlight_row(row):
-                                change = row['Change %']
-                                if change > 0:
-                                    return ['background-color: rgba(16, 185, 129, 0.1); color: #10b981'] * len(row)
-                                elif change < 0:
-                                    return ['background-color: rgba(239, 68, 68, 0.1); color: #ef4444'] * len(row)
-                                return [''] * len(row)
+                            def highlight_rows(df):
+                                css = pd.DataFrame('', index=df.index, columns=df.columns)
+                                css.loc[df['Change %'] > 0, :] = 'background-color: rgba(16, 185, 129, 0.1); color: #10b981'
+                                css.loc[df['Change %'] < 0, :] = 'background-color: rgba(239, 68, 68, 0.1); color: #ef4444'
+                                return css
 
                             st.dataframe(
-                                display_df.style.apply(highlight_row, axis=1),
+                                display_df.style.apply(highlight_rows, axis=None),
                                 hide_index=True,
                                 use_container_width=True
                             )
@@ -384,34 +505,23 @@ with tab1:
 
                             # Department Cards
                             st.markdown("### Department Details")
-                            num_cols = 3
-                            rows = [analysis_sorted.iloc[i:i+num_cols] for i in range(0, len(analysis_sorted), num_cols)]
-
-                            for row_data in rows:
-                                cols = st.columns(num_cols)
-                                for idx, (_, dept) in enumerate(row_data.iterrows()):
-                                    with cols[idx]:
-                                        variance_color = "#10b981" if dept['Variance'] > 0 else ("#ef4444" if dept['Variance'] < 0 else "#888")
-                                        variance_sign = "+" if dept['Variance'] > 0 else ""
-                                        st.markdown(f"""
-                                        <div style="background: white; border-radius: 15px; padding: 20px; box-shadow: 0 4px 15px rgba(0,0,0,0.1); margin-bottom: 15px;">
-                                            <h4 style="color: #333; margin-bottom: 15px; padding-bottom: 10px; border-bottom: 2px solid #667eea;">{dept['Department']}</h4>
-                                            <div style="display: flex; justify-content: space-between; text-align: center;">
-                                                <div style="flex: 1; padding: 10px; background: #f8f9fa; border-radius: 8px; margin-right: 5px;">
-                                                    <p style="font-size: 11px; color: #666; text-transform: uppercase; margin: 0;">Before</p>
-                                                    <p style="font-size: 18px; font-weight: bold; color: #333; margin: 0;">{dept['Before']:.1f}%</p>
-                                                </div>
-                                                <div style="flex: 1; padding: 10px; background: #f8f9fa; border-radius: 8px; margin-right: 5px;">
-                                                    <p style="font-size: 11px; color: #666; text-transform: uppercase; margin: 0;">After</p>
-                                                    <p style="font-size: 18px; font-weight: bold; color: #333; margin: 0;">{dept['After']:.1f}%</p>
-                                                </div>
-                                                <div style="flex: 1; padding: 10px; background: #f8f9fa; border-radius: 8px;">
-                                                    <p style="font-size: 11px; color: #666; text-transform: uppercase; margin: 0;">Change</p>
-                                                    <p style="font-size: 18px; font-weight: bold; color: {variance_color}; margin: 0;">{variance_sign}{dept['Variance']:.1f}%</p>
-                                                </div>
-                                            </div>
-                                        </div>
-                                        """, unsafe_allow_html=True)
+                            variance = analysis_sorted['Variance']
+                            variance_color = pd.Series("#888", index=variance.index).mask(variance > 0, "#10b981").mask(variance < 0, "#ef4444")
+                            variance_sign = pd.Series("", index=variance.index).mask(variance > 0, "+")
+                            stat_box = '<div style="flex: 1; padding: 10px; background: #f8f9fa; border-radius: 8px;{}"><p style="font-size: 11px; color: #666; text-transform: uppercase; margin: 0;">{}</p><p style="font-size: 18px; font-weight: bold; color: '
+                            card_html = (
+                                '<div style="background: white; border-radius: 15px; padding: 20px; box-shadow: 0 4px 15px rgba(0,0,0,0.1);">'
+                                + '<h4 style="color: #333; margin-bottom: 15px; padding-bottom: 10px; border-bottom: 2px solid #667eea;">' + analysis_sorted['Department'].astype(str) + '</h4>'
+                                + '<div style="display: flex; justify-content: space-between; text-align: center;">'
+                                + stat_box.format(" margin-right: 5px;", "Before") + '#333; margin: 0;">' + analysis_sorted['Before'].map('{:.1f}'.format) + '%</p></div>'
+                                + stat_box.format(" margin-right: 5px;", "After") + '#333; margin: 0;">' + analysis_sorted['After'].map('{:.1f}'.format) + '%</p></div>'
+                                + stat_box.format("", "Change") + variance_color + '; margin: 0;">' + variance_sign + variance.map('{:.1f}'.format) + '%</p></div>'
+                                + '</div></div>'
+                            )
+                            st.markdown(
+                                '<div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 15px;">' + ''.join(card_html) + '</div>',
+                                unsafe_allow_html=True
+                            )
 
                             st.markdown("<br>", unsafe_allow_html=True)
 
@@ -424,7 +534,8 @@ with tab1:
                                 <div style="background: white; border-radius: 15px; padding: 30px; box-shadow: 0 4px 15px rgba(0,0,0,0.1); margin-top: 20px;">
                                     <h3 style="color: #667eea; margin-bottom: 20px;">📋 Executive Summary</h3>
                                 """, unsafe_allow_html=True)
-                                summary = generate_summary(analysis)
+                                analysis_key = hash(pd.util.hash_pandas_object(analysis, index=False).values.tobytes())
+                                summary = generate_summary_cached(analysis_key, analysis, improved_mask, declined_mask)
                                 st.markdown(summary)
                                 st.markdown("</div>", unsafe_allow_html=True)
 
@@ -438,43 +549,23 @@ with tab1:
                                     st.markdown(f"**After ({after_year}) Data**")
                                     st.dataframe(after_df, hide_index=True)
 
-with tab2:
-    st.subheader("Add New Case")
-    with st.form("add_case_form"):
-        col1, col2 = st.columns(2)
-        with col1:
-            case_id = st.text_input("Case ID *")
-            description = st.text_input("Description *")
-        with col2:
-            case_date = st.date_input("Date", datetime.today())
-            manager = st.text_input("Manager *")
-        
-        notes = st.text_area("Notes")
-        submitted = st.form_submit_button("Save Case")
-        
-        if submitted:
-            if not case_id or not description or not manager:
-                st.error("Please fill in all required fields (*)")
-            else:
-                try:
-                    add_case(case_id, description, case_date, manager, notes)
-                    st.success(f"Case {case_id} created successfully!")
-                except Exception as e:
-                    st.error(f"Error: Case ID may already exist.")
-    
-    st.divider()
-    st.subheader("Upload Data for Case")
-    
+@st.fragment
+def render_upload():
+    if 'upload_message' in st.session_state:
+        st.success(st.session_state.pop('upload_message'))
+
+    upload_cases = get_cases()
     case_to_upload = st.selectbox("Select Case to Upload Data", 
-                                   get_cases()['case_id'].tolist() if not get_cases().empty else [],
+                                   upload_cases['case_id'].tolist() if not upload_cases.empty else [],
                                    key="upload_case")
     
     if case_to_upload:
         uploaded_file = st.file_uploader("Upload CSV File", type=["csv"])
+        saved = False
         
         if uploaded_file:
             try:
-                df = pd.read_csv(uploaded_file)
+                df = read_upload(uploaded_file)
                 st.dataframe(df.head())
                 
                 year_col = None
@@ -495,8 +586,43 @@ with tab2:
                 
                 if st.button("Save Data"):
                     save_case_data(case_to_upload, year_df, data_year)
-                    st.success(f"Data saved for year {data_year}")
-                    
+                    st.session_state['upload_message'] = f"Data saved for year {data_year}"
+                    saved = True
                     
             except Exception as e:
                 st.error(f"Error reading CSV: {e}")
+
+        # New data changes the Analysis tab too, so rerun the whole app rather than just this fragment
+        if saved:
+            st.rerun()
+
+with tab1:
+    render_analysis()
+
+with tab2:
+    st.subheader("Add New Case")
+    with st.form("add_case_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            case_id = st.text_input("Case ID *")
+            description = st.text_input("Description *")
+        with col2:
+            case_date = st.date_input("Date", datetime.today())
+            manager = st.text_input("Manager *")
+        
+        notes = st.text_area("Notes")
+        submitted = st.form_submit_button("Save Case")
+        
+        if submitted:
+            if not case_id or not description or not manager:
+                st.error("Please fill in all required fields (*)")
+            else:
+                try:
+                    add_case(case_id, description, case_date, manager, notes)
+                    st.success(f"Case {case_id} created successfully!")
+                except Exception as e:
+                    st.error(f"Error: Case ID may already exist.")
+    
+    st.divider()
+    st.subheader("Upload Data for Case")
+    render_upload()